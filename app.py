@@ -1,14 +1,16 @@
 import streamlit as st
 import pandas as pd
-import json
+import orjson
 import os
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-import calendar
 import numpy as np
 from models import Habit, HabitLog, DailyHabitLog, WeeklyHabitLog
 import uuid
+import tempfile
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Set page configuration
 st.set_page_config(page_title="Habit Tracker", layout="wide")
@@ -17,207 +19,369 @@ st.set_page_config(page_title="Habit Tracker", layout="wide")
 if 'current_tab' not in st.session_state:
     st.session_state.current_tab = "Track Habits"
 
+# Data files stored as newline-delimited JSON, one record per line, so new
+# records can be appended without rewriting the whole file
+ndjson_files = {"completed_activities.json"}
+
+def dump_data_file(filename, data):
+    """Serialize data to UTF-8 bytes for a data file, one record per line for NDJSON files;
+    orjson writes the model dataclasses natively"""
+    if filename in ndjson_files and data:
+        return b"".join(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE) for record in data)
+    return orjson.dumps(data)
+
+def parse_data_file(filename, content):
+    """Parse the bytes of a data file, accepting both NDJSON records and a plain JSON array"""
+    if filename in ndjson_files and not content.lstrip().startswith(b"["):
+        lines = [line for line in content.splitlines() if line.strip()]
+        records = [orjson.loads(line) for line in lines[:-1]]
+        if lines:
+            try:
+                records.append(orjson.loads(lines[-1]))
+            except orjson.JSONDecodeError:
+                # A crash during an append leaves the last line half written; drop it
+                # rather than the whole file, and the session's first save rewrites it
+                pass
+        return records
+    return orjson.loads(content)
+
 # GitHub Gist functions
+github_timeout = 10  # seconds before a GitHub API request is abandoned
+
 def get_github_token():
-    return st.secrets["github_token"]
+    """Return the GitHub token, or None when gist sync isn't configured"""
+    try:
+        return st.secrets.get("github_token")
+    except FileNotFoundError:
+        return None
 
-def create_or_update_gist(filename, content, gist_id=None, description="Habit Tracker Data"):
-    """Create a new gist or update an existing one"""
-    token = get_github_token()
-    headers = {
+@st.cache_resource
+def get_github_session(token):
+    """Create one authenticated HTTP session per token and reuse it across reruns"""
+    session = requests.Session()
+    # Keep a few connections alive for the concurrent gist fetches and background writes
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    session.headers.update({
         'Authorization': f'token {token}',
         'Accept': 'application/vnd.github.v3+json'
-    }
+    })
+    return session
+
+@st.cache_resource
+def find_gist_ids(token, description="Habit Tracker Data"):
+    """Map each data filename to the gist holding it, scanning the user's gists once"""
+    session = get_github_session(token)
+    matches = []
+    url = "https://api.github.com/gists"
+    params = {"per_page": 100}
+    
+    while url:
+        # Errors propagate so a failed scan is retried instead of being cached
+        response = session.get(url, params=params, timeout=github_timeout)
+        response.raise_for_status()
+        for gist in response.json():
+            if gist.get("description") == description:
+                matches.append((gist["id"], list(gist["files"])))
+        url = response.links.get("next", {}).get("url")
+        params = None
+    
+    # Data used to live in one gist per file; prefer the gist holding the most
+    # files, which is the one saves go to, then the most recent among equals
+    matches.sort(key=lambda match: len(match[1]), reverse=True)
+    gist_ids = {}
+    for gist_id, filenames in matches:
+        for filename in filenames:
+            gist_ids.setdefault(filename, gist_id)
+    return gist_ids
+
+def create_or_update_gist(files, gist_id=None, description="Habit Tracker Data"):
+    """Create a new gist or update an existing one with several serialized files in one request.
+    Makes no Streamlit calls so it can run on a worker thread; failures raise requests.RequestException"""
+    session = get_github_session(github_token)
     
-    files = {filename: {"content": json.dumps(content, indent=2)}}
+    files = {filename: {"content": content.decode()} for filename, content in files.items()}
     
     if gist_id:
         # Update existing gist
         url = f"https://api.github.com/gists/{gist_id}"
-        response = requests.patch(url, headers=headers, json={"files": files})
+        response = session.patch(url, json={"files": files}, timeout=github_timeout)
     else:
         # Create new gist
         url = "https://api.github.com/gists"
-        response = requests.post(
+        response = session.post(
             url, 
-            headers=headers, 
             json={
                 "description": description,
                 "public": False,
                 "files": files
-            }
+            },
+            timeout=github_timeout
         )
     
-    if response.status_code in [200, 201]:
-        return response.json()["id"]
-    else:
-        st.error(f"Error with GitHub API: {response.status_code} - {response.text}")
-        return None
+    if response.status_code not in [200, 201]:
+        raise requests.HTTPError(f"{response.status_code} - {response.text}", response=response)
+    
+    if not gist_id:
+        # A new gist exists now, so the cached lookup is stale
+        find_gist_ids.clear()
+    # Later sessions must not load the pre-save content from the cache
+    get_gist_contents.clear()
+    return response.json()["id"]
 
-def get_gist_content(gist_id, filename):
-    """Get content from a specific file in a gist"""
-    token = get_github_token()
-    headers = {
-        'Authorization': f'token {token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
+@st.cache_resource
+def get_gist_executor():
+    """One worker shared by all sessions, so gist writes land in the order they were made"""
+    return ThreadPoolExecutor(max_workers=1)
+
+@st.cache_resource
+def get_queued_gist_writes():
+    """Files waiting to be sent to each gist and the job that will send them, shared by all sessions"""
+    return {"lock": threading.Lock(), "files": {}, "futures": {}}
+
+def send_queued_gist_files(queued, gist_id):
+    """Send the files queued for a gist; saves made from here on queue a new job"""
+    with queued["lock"]:
+        files = queued["files"].pop(gist_id)
+        del queued["futures"][gist_id]
+    return create_or_update_gist(files, gist_id)
+
+def queue_gist_write(files, gist_id):
+    """Queue a background update of a gist and return its future. Files still waiting
+    from an earlier save are merged by filename, newest content winning, so at most
+    one payload per gist is ever queued behind the one being sent"""
+    queued = get_queued_gist_writes()
+    with queued["lock"]:
+        if gist_id in queued["futures"]:
+            queued["files"][gist_id].update(files)
+        else:
+            queued["files"][gist_id] = dict(files)
+            queued["futures"][gist_id] = get_gist_executor().submit(send_queued_gist_files, queued, gist_id)
+        return queued["futures"][gist_id]
+
+@st.cache_data(ttl=60)
+def get_gist_contents(token, files):
+    """Get the content of several (gist_id, filename) files, fetching their gists concurrently"""
+    session = get_github_session(token)
     
-    url = f"https://api.github.com/gists/{gist_id}"
-    response = requests.get(url, headers=headers)
+    def fetch(url):
+        response = session.get(url, timeout=github_timeout)
+        response.raise_for_status()
+        return response
     
-    if response.status_code == 200:
-        gist_data = response.json()
-        if filename in gist_data["files"]:
-            file_content = gist_data["files"][filename]["content"]
-            try:
-                return json.loads(file_content)
-            except json.JSONDecodeError:
-                return None
-    return None
-
-# Function to convert model objects to dictionaries for JSON serialization
-def model_to_dict(obj):
-    if isinstance(obj, Habit):
-        return {
-            "id": obj.id if hasattr(obj, 'id') else str(uuid.uuid4()),
-            "name": obj.name,
-            "type": obj.type,
-            "created_at": obj.created_at if hasattr(obj, 'created_at') else datetime.now().strftime("%Y-%m-%d")
-        }
-    elif isinstance(obj, HabitLog):
-        return {
-            "habit": obj.habit,
-            "completed": obj.completed
-        }
-    elif isinstance(obj, DailyHabitLog):
-        return {
-            "date": obj.date.strftime("%Y-%m-%d") if isinstance(obj.date, datetime) else obj.date,
-            "habits": [model_to_dict(h) for h in obj.habits]
-        }
-    elif isinstance(obj, WeeklyHabitLog):
-        return {
-            "week": obj.week,
-            "habits": [model_to_dict(h) for h in obj.habits]
-        }
-    return obj
-
-# Function to convert dictionaries back to model objects
-def dict_to_model(data, model_type):
-    if model_type == Habit:
-        habit = Habit(name=data["name"], type=data["type"])
-        habit.id = data.get("id", str(uuid.uuid4()))
-        habit.created_at = data.get("created_at", datetime.now().strftime("%Y-%m-%d"))
-        return habit
-    elif model_type == HabitLog:
-        return HabitLog(habit=data["habit"], completed=data["completed"])
-    elif model_type == DailyHabitLog:
-        date = data["date"]
-        if isinstance(date, str):
-            date = datetime.strptime(date, "%Y-%m-%d")
-        return DailyHabitLog(
-            date=date,
-            habits=[dict_to_model(h, HabitLog) for h in data["habits"]]
-        )
-    elif model_type == WeeklyHabitLog:
-        return WeeklyHabitLog(
-            week=data["week"],
-            habits=[dict_to_model(h, HabitLog) for h in data["habits"]]
-        )
-    return data
+    # Only the HTTP requests run on worker threads; parsing stays on this one.
+    # Any failed fetch raises, so a partial result is never cached for later sessions
+    gist_ids = sorted({gist_id for gist_id, _ in files})
+    urls = [f"https://api.github.com/gists/{gist_id}" for gist_id in gist_ids]
+    with ThreadPoolExecutor(max_workers=max(len(urls), 1)) as executor:
+        responses = dict(zip(gist_ids, executor.map(fetch, urls)))
+    
+    contents = {}
+    for gist_id, filename in files:
+        gist_files = responses[gist_id].json()["files"]
+        if filename in gist_files:
+            contents[filename] = parse_data_file(filename, gist_files[filename]["content"].encode())
+    return contents
+
+# Functions to convert dictionaries back to model objects
+def habit_from_dict(data):
+    # Only generate defaults when a field is missing; dict.get would build them every time
+    return Habit(
+        id=data["id"] if "id" in data else str(uuid.uuid4()),
+        name=data["name"],
+        type=data["type"],
+        created_at=data["created_at"] if "created_at" in data else datetime.now().strftime("%Y-%m-%d")
+    )
+
+def habit_log_from_dict(data):
+    return HabitLog(**data)
 
-# Initialize or load gist IDs from session state
-if 'gist_ids' not in st.session_state:
-    st.session_state.gist_ids = {
-        'habits': None,
-        'daily_logs': None,
-        'weekly_logs': None,
-        'completed_activities': None
+def daily_habit_log_from_dict(data):
+    date = data["date"]
+    if isinstance(date, str):
+        date = datetime.strptime(date, "%Y-%m-%d")
+    return DailyHabitLog(
+        date=date,
+        habits=[habit_log_from_dict(h) for h in data["habits"]]
+    )
+
+def weekly_habit_log_from_dict(data):
+    return WeeklyHabitLog(
+        week=data["week"],
+        habits=[habit_log_from_dict(h) for h in data["habits"]]
+    )
+
+# Converters looked up by model type instead of testing each type in turn
+model_decoders = {
+    Habit: habit_from_dict,
+    HabitLog: habit_log_from_dict,
+    DailyHabitLog: daily_habit_log_from_dict,
+    WeeklyHabitLog: weekly_habit_log_from_dict
+}
+
+# Initialize or load the ID of the gist holding all data files from session state
+if 'gist_id' not in st.session_state:
+    st.session_state.gist_id = None
+
+# Look the token up once per session; without one the app runs on local files only
+if 'github_token' not in st.session_state:
+    st.session_state.github_token = get_github_token()
+github_token = st.session_state.github_token
+
+def encode_log_bitmaps(logs):
+    """Store day or week logs as one string per period holding a "1" for each completed
+    habit, in the order of the "habits" list, instead of one object per log"""
+    habit_ids = sorted({habit_id for period_logs in logs.values()
+                        for habit_id, log in period_logs.items() if log.completed})
+    positions = {habit_id: i for i, habit_id in enumerate(habit_ids)}
+    periods = {}
+    for period, period_logs in logs.items():
+        bits = ["0"] * len(habit_ids)
+        for habit_id, log in period_logs.items():
+            if log.completed:
+                bits[positions[habit_id]] = "1"
+        # Trailing zeros carry no information
+        bitmap = "".join(bits).rstrip("0")
+        if bitmap:
+            periods[period] = bitmap
+    return {"habits": habit_ids, "periods": periods}
+
+def decode_log_bitmaps(data):
+    """Rebuild the per-period habit log index from encode_log_bitmaps output"""
+    habit_ids = data["habits"]
+    return {
+        period: {habit_ids[i]: HabitLog(habit=habit_ids[i], completed=True)
+                 for i, bit in enumerate(bitmap) if bit == "1"}
+        for period, bitmap in data["periods"].items()
     }
 
-# Function to load data from GitHub Gist or local file
-def load_data(file_path, model_type=None, default_data=None, gist_key=None):
+def build_models(data, model_type):
+    """Convert parsed data file content to the in-memory models; day and week logs
+    are indexed by habit ID within each period"""
+    if model_type in (DailyHabitLog, WeeklyHabitLog) and "periods" in data:
+        return decode_log_bitmaps(data)
+    if isinstance(data, list):
+        decoder = model_decoders[model_type]
+        return [decoder(item) for item in data]
+    elif isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            if model_type == DailyHabitLog or model_type == WeeklyHabitLog:
+                habits = [habit_log_from_dict(h) for h in value]
+                result[key] = {log.habit: log for log in habits}
+            else:
+                result[key] = value
+        return result
+    return data
+
+# Function to load data from GitHub Gist content or local file
+def load_data(file_path, model_type=None, default_data=None, gist_data=None):
     if default_data is None:
         default_data = [] if isinstance(default_data, list) else {}
     
-    # Try to load from GitHub Gist first if we have a gist ID
-    if gist_key and st.session_state.gist_ids.get(gist_key):
-        gist_id = st.session_state.gist_ids[gist_key]
-        filename = os.path.basename(file_path)
-        gist_data = get_gist_content(gist_id, filename)
-        
-        if gist_data is not None:
-            if model_type:
-                if isinstance(gist_data, list):
-                    return [dict_to_model(item, model_type) for item in gist_data]
-                elif isinstance(gist_data, dict):
-                    result = {}
-                    for key, value in gist_data.items():
-                        if model_type == DailyHabitLog or model_type == WeeklyHabitLog:
-                            habits = [dict_to_model(h, HabitLog) for h in value]
-                            result[key] = habits
-                        else:
-                            result[key] = value
-                    return result
-            return gist_data
+    # Use the content fetched from the GitHub Gist first if there is any
+    filename = os.path.basename(file_path)
+    if gist_data is not None:
+        if model_type:
+            return build_models(gist_data, model_type)
+        return gist_data
     
     # Fall back to local file if gist loading failed
     if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
+            with open(file_path, 'rb') as file:
+                data = parse_data_file(filename, file.read())
                 if model_type:
-                    if isinstance(data, list):
-                        return [dict_to_model(item, model_type) for item in data]
-                    elif isinstance(data, dict):
-                        result = {}
-                        for key, value in data.items():
-                            if model_type == DailyHabitLog or model_type == WeeklyHabitLog:
-                                habits = [dict_to_model(h, HabitLog) for h in value]
-                                result[key] = habits
-                            else:
-                                result[key] = value
-                        return result
+                    return build_models(data, model_type)
                 return data
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             return default_data
     else:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
         # Create the file with default data
-        with open(file_path, 'w') as file:
-            json.dump(default_data, file)
+        try:
+            file = open(file_path, 'wb')
+        except FileNotFoundError:
+            # The data directory was removed while the app was running
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            file = open(file_path, 'wb')
+        with file:
+            file.write(orjson.dumps(default_data))
         return default_data
 
-# Function to save data to GitHub Gist and local file
-def save_data(data, file_path, gist_key=None):
-    # Save to local file first
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+def activity_record(activity, deleted=False):
+    """Build the file record for a (habit_id, date, type) activity; a deleted record
+    is a tombstone cancelling an earlier line of the append-only file"""
+    habit_id, date, habit_type = activity
+    record = {"habit_id": habit_id, "date": date, "type": habit_type}
+    if deleted:
+        record["deleted"] = True
+    return record
+
+def replay_activities(records):
+    """Rebuild the set of completed activities from file records, applying tombstones in order"""
+    activities = set()
+    for record in records:
+        activity = (record["habit_id"], record["date"], record["type"])
+        if record.get("deleted"):
+            activities.discard(activity)
+        else:
+            activities.add(activity)
+    return activities
+
+def to_file_data(key, data):
+    """Convert an in-memory data set back to the layout stored in its data file"""
+    if key == 'completed_activities':
+        return [activity_record(activity) for activity in sorted(data, key=lambda activity: (activity[1], activity[0]))]
+    if key in ('daily_logs', 'weekly_logs'):
+        return encode_log_bitmaps(data)
+    return data
+
+def write_file_atomically(file_path, content):
+    """Write a file through a temporary file, synced to disk, and os.replace, so a crash
+    or a concurrent reader never sees it half written"""
+    # mkstemp creates the file readable by its owner only; keep the file's own mode
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+# Function to save data to a local file
+def save_data(data, file_path, appended=None):
+    """Save data locally and return it serialized for the gist; `appended` lists the
+    only records added since the last save of an NDJSON file, letting the write append them.
+    Makes no Streamlit calls so it can run on a worker thread"""
+    # Serialize once for both the local file and the gist
+    filename = os.path.basename(file_path)
+    serialized_data = dump_data_file(filename, data)
     
-    # Convert model objects to dictionaries for JSON serialization
-    if isinstance(data, list):
-        serialized_data = [model_to_dict(item) if hasattr(item, '__dict__') else item for item in data]
-    elif isinstance(data, dict):
-        serialized_data = {}
-        for key, value in data.items():
-            if isinstance(value, list):
-                serialized_data[key] = [model_to_dict(item) if hasattr(item, '__dict__') else item for item in value]
-            else:
-                serialized_data[key] = model_to_dict(value) if hasattr(value, '__dict__') else value
+    # Save to local file
+    if appended is not None and filename in ndjson_files and os.path.exists(file_path):
+        with open(file_path, 'ab') as file:
+            file.write(dump_data_file(filename, appended))
     else:
-        serialized_data = model_to_dict(data) if hasattr(data, '__dict__') else data
+        try:
+            write_file_atomically(file_path, serialized_data)
+        except FileNotFoundError:
+            # The data directory was removed while the app was running
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            write_file_atomically(file_path, serialized_data)
     
-    # Save to local file
-    with open(file_path, 'w') as file:
-        json.dump(serialized_data, file)
-    
-    # Save to GitHub Gist if gist_key is provided
-    if gist_key:
-        filename = os.path.basename(file_path)
-        gist_id = st.session_state.gist_ids.get(gist_key)
-        new_gist_id = create_or_update_gist(filename, serialized_data, gist_id)
-        
-        if new_gist_id:
-            st.session_state.gist_ids[gist_key] = new_gist_id
+    return serialized_data
+
+@st.cache_resource
+def get_io_executor():
+    """Worker threads shared by all sessions for writing data files concurrently"""
+    return ThreadPoolExecutor(max_workers=len(data_files))
 
 # File paths
 habits_file = "data/habits.json"
@@ -225,11 +389,345 @@ daily_logs_file = "data/daily_logs.json"
 weekly_logs_file = "data/weekly_logs.json"
 completed_activities_file = "data/completed_activities.json"
 
-# Load data
-habits = load_data(habits_file, Habit, [], 'habits')
-daily_logs = load_data(daily_logs_file, DailyHabitLog, {}, 'daily_logs')
-weekly_logs = load_data(weekly_logs_file, WeeklyHabitLog, {}, 'weekly_logs')
-completed_activities = load_data(completed_activities_file, None, [], 'completed_activities')
+data_files = {
+    'habits': habits_file,
+    'daily_logs': daily_logs_file,
+    'weekly_logs': weekly_logs_file,
+    'completed_activities': completed_activities_file
+}
+data_filenames = [os.path.basename(file_path) for file_path in data_files.values()]
+
+@st.cache_resource
+def ensure_data_dir(path):
+    """Create the data directory once per process instead of on every save"""
+    os.makedirs(path, exist_ok=True)
+
+ensure_data_dir(os.path.dirname(habits_file))
+
+# Set when gist sync is configured but the gist couldn't be loaded, or couldn't be
+# created; saves then stay local, so the session's local data never overwrites the gist
+# and a failing GitHub isn't retried on every click
+if 'gist_sync_error' not in st.session_state:
+    st.session_state.gist_sync_error = None
+
+# Load data once per session; reruns work on the in-memory copies
+if 'habits' not in st.session_state:
+    # Fetch every data file's gist concurrently, then parse the files one by one
+    gist_files = []
+    if github_token:
+        # Look the gist up once, here; if the scan fails the session never syncs,
+        # since a later lookup could find the gist and overwrite it with local data
+        try:
+            gist_ids = find_gist_ids(github_token)
+        except requests.RequestException as error:
+            st.session_state.gist_sync_error = f"Error loading from GitHub: {error}"
+            gist_ids = {}
+        gist_files = [(gist_ids[filename], filename) for filename in data_filenames if filename in gist_ids]
+        st.session_state.gist_id = next((gist_id for gist_id, _ in gist_files), None)
+    gist_data = {}
+    if gist_files:
+        # Wait for queued gist writes from other sessions, which the single worker
+        # runs in order, so this load doesn't fetch the gist from before them. With one
+        # write being sent and at most one queued per gist, this is normally two requests
+        _, still_queued = wait([get_gist_executor().submit(lambda: None)], timeout=2 * github_timeout)
+        if still_queued:
+            st.session_state.gist_sync_error = "Error loading from GitHub: earlier changes are still being saved to the gist"
+        else:
+            try:
+                gist_data = get_gist_contents(github_token, tuple(gist_files))
+            except (requests.RequestException, orjson.JSONDecodeError) as error:
+                st.session_state.gist_sync_error = f"Error loading from GitHub: {error}"
+    
+    st.session_state.habits = load_data(habits_file, Habit, [], gist_data.get("habits.json"))
+    st.session_state.daily_logs = load_data(daily_logs_file, DailyHabitLog, {}, gist_data.get("daily_logs.json"))
+    st.session_state.weekly_logs = load_data(weekly_logs_file, WeeklyHabitLog, {}, gist_data.get("weekly_logs.json"))
+    activities = load_data(completed_activities_file, None, [], gist_data.get("completed_activities.json"))
+    # Activities are kept as a set of (habit_id, date, type) tuples
+    st.session_state.completed_activities = replay_activities(activities)
+
+if st.session_state.gist_sync_error:
+    st.error(f"{st.session_state.gist_sync_error}. Changes are saved locally only until the app is reloaded.")
+
+# Habits split by type and indexed by ID, kept in step with the habits list on add and delete
+if 'habits_by_type' not in st.session_state:
+    st.session_state.habits_by_type = {"daily": [], "weekly": []}
+    for habit in st.session_state.habits:
+        st.session_state.habits_by_type[habit.type].append(habit)
+if 'habits_by_id' not in st.session_state:
+    st.session_state.habits_by_id = {habit.id: habit for habit in st.session_state.habits}
+
+# Names of the data files changed since the last flush
+if 'dirty' not in st.session_state:
+    st.session_state.dirty = set()
+
+# Activity records to append at the next flush, with tombstones for removed
+# activities, or None when the file must be rewritten (the session's first save,
+# which also drops old tombstones, or an empty file holding "[]")
+if 'appended_activities' not in st.session_state:
+    st.session_state.appended_activities = None
+
+# Background gist writes not yet reported back to this session
+if 'pending_gist_writes' not in st.session_state:
+    st.session_state.pending_gist_writes = []
+
+def reap_gist_writes():
+    """Report background gist writes that failed since the last rerun. Called at the top of
+    each section fragment, since fragment reruns skip the module-level code"""
+    pending = []
+    for future in st.session_state.pending_gist_writes:
+        if not future.done():
+            pending.append(future)
+        elif future.exception() is not None:
+            error = future.exception()
+            st.error(f"Error saving to GitHub: {error}")
+            if isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 404:
+                # The gist was deleted; forget it so the next save creates a new one
+                find_gist_ids.clear()
+                st.session_state.gist_id = None
+    st.session_state.pending_gist_writes = pending
+
+habits = st.session_state.habits
+daily_logs = st.session_state.daily_logs
+weekly_logs = st.session_state.weekly_logs
+completed_activities = st.session_state.completed_activities
+habits_by_type = st.session_state.habits_by_type
+habits_by_id = st.session_state.habits_by_id
+
+def flush_data():
+    """Save each data file that changed since the last flush, once, then send them
+    all to the gist in a single request"""
+    if st.session_state.dirty and github_token and not st.session_state.gist_id and not st.session_state.gist_sync_error:
+        # A new gist must start out holding every data file, not just the changed ones
+        st.session_state.dirty.update(data_files)
+    keys = sorted(st.session_state.dirty)
+    file_paths = [data_files[key] for key in keys]
+    
+    # Write the changed files concurrently; the threads only serialize and write
+    futures = []
+    for key, file_path in zip(keys, file_paths):
+        appended = st.session_state.appended_activities if key == 'completed_activities' else None
+        futures.append(get_io_executor().submit(save_data, to_file_data(key, st.session_state[key]), file_path, appended))
+    pending_files = {os.path.basename(file_path): future.result() for file_path, future in zip(file_paths, futures)}
+    
+    # The API has no append, so the gist always receives the full files
+    if pending_files and github_token and not st.session_state.gist_sync_error:
+        if st.session_state.gist_id:
+            # Update in the background so a slow GitHub response doesn't hold up the page
+            future = queue_gist_write(pending_files, st.session_state.gist_id)
+            if future not in st.session_state.pending_gist_writes:
+                st.session_state.pending_gist_writes.append(future)
+        else:
+            # The first save creates the gist, and later writes need its ID
+            try:
+                st.session_state.gist_id = create_or_update_gist(pending_files)
+            except requests.RequestException as error:
+                # Stop syncing rather than block every later click on another attempt
+                st.session_state.gist_sync_error = f"Error saving to GitHub: {error}"
+                st.error(f"{st.session_state.gist_sync_error}. Changes are saved locally only until the app is reloaded.")
+    
+    if 'completed_activities' in st.session_state.dirty:
+        st.session_state.appended_activities = [] if st.session_state.completed_activities else None
+    st.session_state.dirty.clear()
+
+def record_activity(habit_id, date, habit_type):
+    """Add a completed activity for analytics and queue it for an append-only save"""
+    activity = (habit_id, date, habit_type)
+    st.session_state.completed_activities.add(activity)
+    if st.session_state.appended_activities is not None:
+        st.session_state.appended_activities.append(activity_record(activity))
+    st.session_state.dirty.add('completed_activities')
+
+def set_habit_completion(logs, period, habit, completed, today):
+    """Mark a habit done or not done for a day or week and keep completed activities in step"""
+    logs_key = f"{habit.type}_logs"
+    
+    if completed:
+        # Check if habit already exists in logs
+        period_logs = logs.setdefault(period, {})
+        log = period_logs.get(habit.id)
+        if log is None:
+            period_logs[habit.id] = HabitLog(habit=habit.id, completed=True)
+        elif log.completed:
+            return
+        else:
+            log.completed = True
+        
+        # Add to completed activities for analytics
+        record_activity(habit.id, today, habit.type)
+        st.session_state.dirty.add(logs_key)
+    elif period in logs:
+        log = logs[period].get(habit.id)
+        if log is not None and log.completed:
+            log.completed = False
+            st.session_state.dirty.add(logs_key)
+        
+        # Remove from completed activities
+        activity = (habit.id, today, habit.type)
+        if activity in st.session_state.completed_activities:
+            st.session_state.completed_activities.discard(activity)
+            if st.session_state.appended_activities is not None:
+                st.session_state.appended_activities.append(activity_record(activity, deleted=True))
+            st.session_state.dirty.add('completed_activities')
+
+def is_logged_complete(logs, period, habit_id):
+    """Return True if the habit is logged as done for the day or week"""
+    log = logs.get(period, {}).get(habit_id)
+    return log is not None and log.completed
+
+def apply_checklist_edits(key, habits_to_track, logs, period, today):
+    """Apply the Done values edited in a checklist to the logs; edits accumulate in the
+    editor's state, and re-applying an already applied row changes nothing"""
+    for row, edits in st.session_state[key]["edited_rows"].items():
+        if "Done" in edits:
+            set_habit_completion(logs, period, habits_to_track[int(row)], bool(edits["Done"]), today)
+
+def habit_checklist(habits_to_track, completed_ids, logs, period, today, key):
+    """Show habits as one editable table with a Done column; toggled rows are applied
+    to the logs by the editor's on_change callback"""
+    done = [habit.id in completed_ids for habit in habits_to_track]
+    
+    # The editor's identity comes from its input frame, so the frame is kept while the
+    # table (frame plus the editor's own edits) still agrees with the logs. A toggle then
+    # leaves the table mounted, and a click made before the redraw isn't lost
+    frame_key = f"{key}_frame"
+    checklist = st.session_state.get(frame_key)
+    if checklist is not None and checklist["period"] == period and checklist["habits"] == habits_to_track:
+        shown = list(checklist["frame"]["Done"])
+        for row, edits in st.session_state.get(key, {}).get("edited_rows", {}).items():
+            if "Done" in edits:
+                shown[int(row)] = bool(edits["Done"])
+        if shown != done:
+            checklist = None
+    else:
+        checklist = None
+    if checklist is None:
+        checklist = st.session_state[frame_key] = {
+            "period": period,
+            "habits": list(habits_to_track),
+            "frame": pd.DataFrame({"Habit": [habit.name for habit in habits_to_track], "Done": done})
+        }
+    
+    st.data_editor(
+        checklist["frame"],
+        key=key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Habit"],
+        column_config={"Done": st.column_config.CheckboxColumn("Done")},
+        on_change=apply_checklist_edits,
+        args=(key, checklist["habits"], logs, period, today)
+    )
+
+# Analytics helpers
+days_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+@st.cache_data(max_entries=2)
+def analytics_window(today):
+    """Return the day keys and the week keys (in order, without duplicates) of the
+    4 weeks up to today, formatted once per day rather than on every rerun"""
+    end_date = datetime.strptime(today, "%Y-%m-%d")
+    dates = pd.date_range(end_date - timedelta(days=28), end_date, freq="D")
+    return tuple(dates.strftime("%Y-%m-%d")), tuple(dates.strftime("%Y-W%U").unique())
+
+def build_daily_frame(date_range, completed_dates):
+    """Build the per-day completion DataFrame for a daily habit"""
+    # Build the DataFrame column-wise from datetime64 arrays, so pandas neither
+    # parses the date strings nor infers column types
+    dates = np.array(date_range, dtype="datetime64[D]")
+    df = pd.DataFrame({
+        "date": dates.astype("datetime64[ns]"),
+        "completed": np.isin(dates, np.array(completed_dates, dtype="datetime64[D]"))
+    })
+    # Sunday-based week number (same as strftime "%U"), computed numerically
+    df["year"] = df["date"].dt.year
+    df["week"] = (df["date"].dt.dayofyear + 6 - (df["date"].dt.dayofweek + 1) % 7) // 7
+    # Day names as an ordered categorical built straight from the weekday codes
+    df["day"] = pd.Categorical.from_codes(df["date"].dt.dayofweek, categories=days_order, ordered=True)
+    df["completed_int"] = df["completed"].astype(int)
+    return df
+
+def build_weekly_frame(weeks, completed_weeks):
+    """Build the per-week completion DataFrame for a weekly habit"""
+    df = pd.DataFrame({"week": weeks})
+    df["completed"] = df["week"].isin(completed_weeks)
+    df["completed_int"] = df["completed"].astype(int)
+    df["week_label"] = [f"Week {w.split('-W')[1]}" for w in df["week"]]
+    return df
+
+def streak_lengths(completed):
+    """Length of the run of completions ending at each position, 0 where not completed"""
+    completed = np.asarray(completed, dtype=bool)
+    positions = np.arange(len(completed))
+    # Position of the latest miss at or before each entry, -1 before the first miss
+    last_miss = np.maximum.accumulate(np.where(completed, -1, positions))
+    return np.where(completed, positions - last_miss, 0)
+
+@st.cache_data(max_entries=64)
+def compute_daily_analytics(date_range, completed_dates):
+    """Compute every table behind a daily habit's analytics; cached until its completions change"""
+    df = build_daily_frame(date_range, completed_dates)
+    
+    # Group by week and calculate completion rate
+    weekly_completion = df.groupby(["year", "week"])["completed"].mean() * 100
+    weekly_df = pd.DataFrame({
+        "Week": [f"Week {week:02d}" for _, week in weekly_completion.index],
+        "Completion Rate (%)": weekly_completion.values
+    }).set_index("Week")
+    
+    # Group by day of week to see patterns (the categorical keeps Monday first)
+    day_of_week_completion = df.groupby("day", observed=False)["completed_int"].mean() * 100
+    day_df = pd.DataFrame({
+        "Day": day_of_week_completion.index.astype(str),
+        "Completion Rate (%)": day_of_week_completion.values
+    }).set_index("Day")
+    
+    # Each date has exactly one (year, week, day) cell, so reshape directly
+    # instead of grouping with pivot_table; columns start with Monday
+    pivot_df = df.set_index(["year", "week", "day"])["completed_int"].unstack("day").reindex(columns=days_order)
+    
+    # Streak length at each day, from which the current and longest streaks follow
+    streak = streak_lengths(df["completed"])
+    streak_df = pd.DataFrame({
+        "Date": df["date"],
+        "Streak (days)": streak
+    }).set_index("Date")
+    
+    return {
+        "total": len(df),
+        "completed": int(df["completed_int"].sum()),
+        "weekly_df": weekly_df,
+        "day_df": day_df,
+        "pivot_df": pivot_df,
+        "current_streak": int(streak[-1]) if len(streak) else 0,
+        "longest_streak": int(streak.max(initial=0)),
+        "streak_df": streak_df
+    }
+
+@st.cache_data(max_entries=64)
+def compute_weekly_analytics(weeks, completed_weeks):
+    """Compute every table behind a weekly habit's analytics; cached until its completions change"""
+    df = build_weekly_frame(weeks, completed_weeks)
+    
+    weekly_df = pd.DataFrame({
+        "Week": df["week_label"],
+        "Completed": df["completed_int"]
+    }).set_index("Week")
+    
+    # Streak length at each week, from which the current and longest streaks follow
+    streak = streak_lengths(df["completed"])
+    streak_df = pd.DataFrame({
+        "Week": df["week_label"],
+        "Streak (weeks)": streak
+    }).set_index("Week")
+    
+    return {
+        "total": len(df),
+        "completed": int(df["completed_int"].sum()),
+        "weekly_df": weekly_df,
+        "current_streak": int(streak[-1]) if len(streak) else 0,
+        "longest_streak": int(streak.max(initial=0)),
+        "streak_df": streak_df
+    }
 
 # Main title
 st.title("Habit Tracker")
@@ -240,123 +738,49 @@ selected_tab = st.radio("Navigation", tabs, index=tabs.index(st.session_state.cu
 st.session_state.current_tab = selected_tab
 
 # Section 1: Track Habits
-if selected_tab == "Track Habits":
+# Each section is a fragment so its widgets only rerun that section
+@st.fragment
+def track_habits_section():
+    reap_gist_writes()
     st.header("Track Your Habits")
     
-    # Get current date
-    today = datetime.now().strftime("%Y-%m-%d")
-    current_week = datetime.now().strftime("%Y-W%U")
+    # Get current date and week from one clock reading, so they agree at midnight
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    current_week = now.strftime("%Y-W%U")
     
     # Create two columns for daily and weekly habits
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Daily Habits")
-        daily_habits = [habit for habit in habits if habit.type == "daily"]
+        daily_habits = habits_by_type["daily"]
         
         if not daily_habits:
             st.info("No daily habits added yet. Go to 'Add Habits' to create some!")
-        
-        for habit in daily_habits:
-            # Check if habit was completed today
-            is_completed = False
-            if today in daily_logs:
-                for log in daily_logs[today]:
-                    if log.habit == habit.id:
-                        is_completed = log.completed
-            
-            # Create checkbox for habit
-            if st.checkbox(habit.name, value=is_completed, key=f"daily_{habit.id}"):
-                # If checked, add to completed
-                if today not in daily_logs:
-                    daily_logs[today] = []
-                
-                # Check if habit already exists in logs
-                habit_exists = False
-                for log in daily_logs[today]:
-                    if log.habit == habit.id:
-                        log.completed = True
-                        habit_exists = True
-                        break
-                
-                if not habit_exists:
-                    daily_logs[today].append(HabitLog(habit=habit.id, completed=True))
-                    
-                    # Add to completed activities for analytics
-                    completed_activities.append({
-                        "habit_id": habit.id,
-                        "date": today,
-                        "type": "daily"
-                    })
-            else:
-                # If unchecked, mark as not completed
-                if today in daily_logs:
-                    for log in daily_logs[today]:
-                        if log.habit == habit.id:
-                            log.completed = False
-                            break
-                    
-                    # Remove from completed activities
-                    completed_activities = [act for act in completed_activities 
-                                           if not (act["habit_id"] == habit.id and act["date"] == today)]
+        else:
+            # Habits completed today, collected in a single pass over today's logs
+            completed_today = {log.habit for log in daily_logs.get(today, {}).values() if log.completed}
+            habit_checklist(daily_habits, completed_today, daily_logs, today, today, "daily_checklist")
     
     with col2:
         st.subheader("Weekly Habits")
-        weekly_habits = [habit for habit in habits if habit.type == "weekly"]
+        weekly_habits = habits_by_type["weekly"]
         
         if not weekly_habits:
             st.info("No weekly habits added yet. Go to 'Add Habits' to create some!")
-        
-        for habit in weekly_habits:
-            # Check if habit was completed this week
-            is_completed = False
-            if current_week in weekly_logs:
-                for log in weekly_logs[current_week]:
-                    if log.habit == habit.id:
-                        is_completed = log.completed
-            
-            # Create checkbox for habit
-            if st.checkbox(habit.name, value=is_completed, key=f"weekly_{habit.id}"):
-                # If checked, add to completed
-                if current_week not in weekly_logs:
-                    weekly_logs[current_week] = []
-                
-                # Check if habit already exists in logs
-                habit_exists = False
-                for log in weekly_logs[current_week]:
-                    if log.habit == habit.id:
-                        log.completed = True
-                        habit_exists = True
-                        break
-                
-                if not habit_exists:
-                    weekly_logs[current_week].append(HabitLog(habit=habit.id, completed=True))
-                    
-                    # Add to completed activities for analytics
-                    completed_activities.append({
-                        "habit_id": habit.id,
-                        "date": today,
-                        "type": "weekly"
-                    })
-            else:
-                # If unchecked, mark as not completed
-                if current_week in weekly_logs:
-                    for log in weekly_logs[current_week]:
-                        if log.habit == habit.id:
-                            log.completed = False
-                            break
-                    
-                    # Remove from completed activities
-                    completed_activities = [act for act in completed_activities 
-                                           if not (act["habit_id"] == habit.id and act["date"] == today and act["type"] == "weekly")]
+        else:
+            # Habits completed this week, collected in a single pass over this week's logs
+            completed_this_week = {log.habit for log in weekly_logs.get(current_week, {}).values() if log.completed}
+            habit_checklist(weekly_habits, completed_this_week, weekly_logs, current_week, today, "weekly_checklist")
     
-    # Save data after changes
-    save_data(daily_logs, daily_logs_file, 'daily_logs')
-    save_data(weekly_logs, weekly_logs_file, 'weekly_logs')
-    save_data(completed_activities, completed_activities_file, 'completed_activities')
+    # Persist the edits applied by the checklists' callbacks
+    flush_data()
 
 # Section 2: Add Habits
-elif selected_tab == "Add Habits":
+@st.fragment
+def add_habits_section():
+    reap_gist_writes()
     st.header("Add New Habits")
     
     # Form for adding new habits
@@ -368,16 +792,20 @@ elif selected_tab == "Add Habits":
         
         if submitted and habit_name:
             # Create new habit
-            new_habit = Habit(name=habit_name, type=habit_type)
-            new_habit.id = str(uuid.uuid4())
-            new_habit.created_at = datetime.now().strftime("%Y-%m-%d")
+            new_habit = Habit(
+                id=str(uuid.uuid4()),
+                name=habit_name,
+                type=habit_type,
+                created_at=datetime.now().strftime("%Y-%m-%d")
+            )
             
             # Add to habits list
             habits.append(new_habit)
+            habits_by_type[new_habit.type].append(new_habit)
+            habits_by_id[new_habit.id] = new_habit
+            st.session_state.dirty.add('habits')
             
-            # Save updated habits
-            save_data(habits, habits_file, 'habits')
-            
+            flush_data()
             st.success(f"Habit '{habit_name}' added successfully!")
     
     # Display existing habits with delete option
@@ -386,12 +814,15 @@ elif selected_tab == "Add Habits":
     if not habits:
         st.info("No habits added yet.")
     else:
+        # Habits whose Delete button was clicked; removed after rendering
+        to_delete = []
+        
         # Create two columns for daily and weekly habits
         col1, col2 = st.columns(2)
         
         with col1:
             st.write("Daily Habits")
-            daily_habits = [habit for habit in habits if habit.type == "daily"]
+            daily_habits = habits_by_type["daily"]
             
             if not daily_habits:
                 st.write("No daily habits added yet.")
@@ -402,14 +833,12 @@ elif selected_tab == "Add Habits":
                     st.write(f"**{habit.name}**")
                 with col1b:
                     if st.button("Delete", key=f"del_daily_{habit.id}"):
-                        habits.remove(habit)
-                        save_data(habits, habits_file, 'habits')
-                        st.experimental_rerun()
+                        to_delete.append(habit)
                 st.divider()
         
         with col2:
             st.write("Weekly Habits")
-            weekly_habits = [habit for habit in habits if habit.type == "weekly"]
+            weekly_habits = habits_by_type["weekly"]
             
             if not weekly_habits:
                 st.write("No weekly habits added yet.")
@@ -420,38 +849,38 @@ elif selected_tab == "Add Habits":
                     st.write(f"**{habit.name}**")
                 with col2b:
                     if st.button("Delete", key=f"del_weekly_{habit.id}"):
-                        habits.remove(habit)
-                        save_data(habits, habits_file, 'habits')
-                        st.experimental_rerun()
+                        to_delete.append(habit)
                 st.divider()
+        
+        if to_delete:
+            for habit in to_delete:
+                habits.remove(habit)
+                habits_by_type[habit.type].remove(habit)
+                del habits_by_id[habit.id]
+            st.session_state.dirty.add('habits')
+            flush_data()
+            st.rerun(scope="fragment")
 
 # Section 3: Analytics
-elif selected_tab == "Analytics":
+@st.fragment
+def analytics_section():
+    reap_gist_writes()
     st.header("Habit Analytics")
     
     if not habits:
         st.info("No habits to analyze. Add some habits first!")
     else:
-        # Get habit completion data for the last 4 weeks
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=28)  # 4 weeks
-        
-        # Create date range for the last 4 weeks
-        date_range = []
-        current_date = start_date
-        while current_date <= end_date:
-            date_range.append(current_date.strftime("%Y-%m-%d"))
-            current_date += timedelta(days=1)
+        # Get the day and week keys for the last 4 weeks (formatted once per day)
+        date_range, weeks = analytics_window(datetime.now().strftime("%Y-%m-%d"))
         
         # Select habit for analysis
-        habit_options = [(habit.id, habit.name) for habit in habits]
         selected_habit_id = st.selectbox(
             "Select Habit to Analyze",
-            options=[opt[0] for opt in habit_options],
-            format_func=lambda x: next((opt[1] for opt in habit_options if opt[0] == x), x)
+            options=list(habits_by_id),
+            format_func=lambda x: habits_by_id[x].name if x in habits_by_id else x
         )
         
-        selected_habit = next((h for h in habits if h.id == selected_habit_id), None)
+        selected_habit = habits_by_id.get(selected_habit_id)
         
         if selected_habit:
             st.subheader(f"Analytics for: {selected_habit.name}")
@@ -460,28 +889,16 @@ elif selected_tab == "Analytics":
             is_daily = selected_habit.type == "daily"
             
             if is_daily:
-                # Create data for daily habit
-                completion_data = []
-                for date in date_range:
-                    is_completed = False
-                    if date in daily_logs:
-                        for log in daily_logs[date]:
-                            if log.habit == selected_habit_id and log.completed:
-                                is_completed = True
-                                break
-                    completion_data.append({"date": date, "completed": is_completed})
+                # Dates in the range on which the habit was completed
+                completed_dates = {date for date in date_range
+                                   if is_logged_complete(daily_logs, date, selected_habit_id)}
                 
-                # Convert to DataFrame for easier manipulation
-                df = pd.DataFrame(completion_data)
-                df["date"] = pd.to_datetime(df["date"])
-                df["week"] = df["date"].dt.strftime("%U")
-                df["day"] = df["date"].dt.strftime("%a")
-                df["day_num"] = df["date"].dt.dayofweek
-                df["completed_int"] = df["completed"].astype(int)
+                # Build the tables behind every chart (cached between reruns)
+                analytics = compute_daily_analytics(date_range, tuple(sorted(completed_dates)))
                 
                 # Create metrics for quick stats
-                total_days = len(df)
-                completed_days = df["completed_int"].sum()
+                total_days = analytics["total"]
+                completed_days = analytics["completed"]
                 completion_percentage = (completed_days / total_days) * 100 if total_days > 0 else 0
                 
                 # Display metrics in a row
@@ -493,166 +910,88 @@ elif selected_tab == "Analytics":
                 with col3:
                     st.metric("Overall Completion", f"{completion_percentage:.1f}%")
                 
-                # Group by week and calculate completion rate
-                weekly_completion = df.groupby("week")["completed"].mean() * 100
-                
                 # Create a more visually appealing weekly completion chart
                 st.subheader("Weekly Completion Rate")
                 
-                # Use Streamlit's native chart capabilities for better interactivity
-                weekly_df = pd.DataFrame({
-                    "Week": [f"Week {w}" for w in weekly_completion.index],
-                    "Completion Rate (%)": weekly_completion.values
-                })
-                
                 # Create a bar chart with Streamlit
-                st.bar_chart(weekly_df.set_index("Week"))
+                st.bar_chart(analytics["weekly_df"])
                 
                 # Create a daily view
                 st.subheader("Daily Completion")
                 
-                # Create a more detailed daily view
-                # Group by day of week to see patterns
-                day_of_week_completion = df.groupby("day")["completed_int"].mean() * 100
-                
-                # Reorder days to start with Monday
-                days_order = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-                day_of_week_completion = day_of_week_completion.reindex(days_order)
-                
-                day_df = pd.DataFrame({
-                    "Day": day_of_week_completion.index,
-                    "Completion Rate (%)": day_of_week_completion.values
-                })
-                
                 # Create a bar chart for day of week patterns
-                st.bar_chart(day_df.set_index("Day"))
+                st.bar_chart(analytics["day_df"])
                 
                 # Create a calendar heatmap view
                 st.subheader("Calendar View")
                 
-                # Create a more visually appealing heatmap
-                # Pivot data for heatmap
-                pivot_df = df.pivot_table(
-                    index=df["date"].dt.strftime("%U"),  # Week number
-                    columns=df["date"].dt.strftime("%a"),  # Day name
-                    values="completed_int",
-                    aggfunc="first"
-                )
-                
-                # Reorder columns to start with Monday
-                pivot_df = pivot_df.reindex(columns=days_order)
-                
-                # Create a custom colormap
-                fig, ax = plt.subplots(figsize=(10, 6))
-                cmap = plt.cm.get_cmap("RdYlGn")
-                
-                # Create a more visually appealing heatmap
-                heatmap = ax.pcolor(pivot_df, cmap=cmap, vmin=0, vmax=1, edgecolors='w', linewidths=2)
-                
-                # Set labels
-                ax.set_xticks(np.arange(len(pivot_df.columns)) + 0.5)
-                ax.set_yticks(np.arange(len(pivot_df.index)) + 0.5)
-                ax.set_xticklabels(pivot_df.columns, fontweight='bold')
-                ax.set_yticklabels([f"Week {w}" for w in pivot_df.index], fontweight='bold')
-                
-                # Rotate the tick labels and set alignment
-                plt.setp(ax.get_xticklabels(), rotation=0, ha="center")
-                plt.setp(ax.get_yticklabels(), rotation=0, ha="right")
-                
-                # Add a title
-                ax.set_title(f"Daily Completion for {selected_habit.name}", fontsize=16, fontweight='bold', pad=20)
-                
-                # Add colorbar
-                cbar = plt.colorbar(heatmap)
-                cbar.set_ticks([0.25, 0.75])
-                cbar.set_ticklabels(["Not Completed", "Completed"])
-                
-                # Improve the appearance
-                fig.tight_layout()
-                
-                # Display the heatmap
-                st.pyplot(fig)
+                # An all-red calendar says nothing new, so skip drawing it
+                if completed_days == 0:
+                    st.info("No completions in the last 4 weeks yet.")
+                else:
+                    pivot_df = analytics["pivot_df"]
+                    
+                    # Create a custom colormap
+                    fig, ax = plt.subplots(figsize=(10, 6))
+                    cmap = plt.get_cmap("RdYlGn")
+                    
+                    # Draw the grid as a single mesh rather than one patch per cell;
+                    # days outside the range are NaN and stay blank
+                    heatmap = ax.pcolormesh(pivot_df, cmap=cmap, vmin=0, vmax=1, edgecolors='w', linewidths=2)
+                    
+                    # Set labels
+                    ax.set_xticks(np.arange(len(pivot_df.columns)) + 0.5)
+                    ax.set_yticks(np.arange(len(pivot_df.index)) + 0.5)
+                    ax.set_xticklabels(pivot_df.columns, fontweight='bold')
+                    ax.set_yticklabels([f"Week {week:02d}" for _, week in pivot_df.index], fontweight='bold')
+                    
+                    # Rotate the tick labels and set alignment
+                    plt.setp(ax.get_xticklabels(), rotation=0, ha="center")
+                    plt.setp(ax.get_yticklabels(), rotation=0, ha="right")
+                    
+                    # Add a title
+                    ax.set_title(f"Daily Completion for {selected_habit.name}", fontsize=16, fontweight='bold', pad=20)
+                    
+                    # Add colorbar
+                    cbar = plt.colorbar(heatmap)
+                    cbar.set_ticks([0.25, 0.75])
+                    cbar.set_ticklabels(["Not Completed", "Completed"])
+                    
+                    # Improve the appearance
+                    fig.tight_layout()
+                    
+                    # Display the heatmap
+                    st.pyplot(fig)
+                    
+                    # Release the figure; pyplot keeps every open figure alive otherwise
+                    plt.close(fig)
                 
                 # Calculate and display streak information
                 st.subheader("Streak Information")
                 
-                # Calculate current streak
-                current_streak = 0
-                for entry in reversed(completion_data):
-                    if entry["completed"]:
-                        current_streak += 1
-                    else:
-                        break
-                
-                # Calculate longest streak
-                longest_streak = 0
-                current = 0
-                for entry in completion_data:
-                    if entry["completed"]:
-                        current += 1
-                        longest_streak = max(longest_streak, current)
-                    else:
-                        current = 0
-                
                 # Display streak metrics
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Current Streak", f"{current_streak} days")
+                    st.metric("Current Streak", f"{analytics['current_streak']} days")
                 with col2:
-                    st.metric("Longest Streak", f"{longest_streak} days")
-                
-                # Create a line chart showing the streak over time
-                streak_data = []
-                current = 0
-                for entry in completion_data:
-                    if entry["completed"]:
-                        current += 1
-                    else:
-                        current = 0
-                    streak_data.append({"date": entry["date"], "streak": current})
-                
-                streak_df = pd.DataFrame(streak_data)
-                streak_df["date"] = pd.to_datetime(streak_df["date"])
+                    st.metric("Longest Streak", f"{analytics['longest_streak']} days")
                 
                 # Create a line chart for streak visualization
                 st.subheader("Streak Over Time")
                 
-                # Format for display
-                streak_chart_df = pd.DataFrame({
-                    "Date": streak_df["date"],
-                    "Streak (days)": streak_df["streak"]
-                }).set_index("Date")
-                
-                st.line_chart(streak_chart_df)
+                st.line_chart(analytics["streak_df"])
                 
             else:  # Weekly habit
-                # Get weeks in the date range
-                weeks = []
-                for date in date_range:
-                    week = datetime.strptime(date, "%Y-%m-%d").strftime("%Y-W%U")
-                    if week not in weeks:
-                        weeks.append(week)
-                
-                # Create data for weekly habit
-                completion_data = []
-                for week in weeks:
-                    is_completed = False
-                    if week in weekly_logs:
-                        for log in weekly_logs[week]:
-                            if log.habit == selected_habit_id and log.completed:
-                                is_completed = True
-                                break
-                    completion_data.append({"week": week, "completed": is_completed})
+                # Weeks in the range in which the habit was completed
+                completed_weeks = {week for week in weeks
+                                   if is_logged_complete(weekly_logs, week, selected_habit_id)}
                 
-                # Convert to DataFrame
-                df = pd.DataFrame(completion_data)
-                df["completed_int"] = df["completed"].astype(int)
-                df["week_num"] = [w.split("-W")[1] for w in df["week"]]
-                df["week_label"] = [f"Week {w}" for w in df["week_num"]]
+                # Build the tables behind every chart (cached between reruns)
+                analytics = compute_weekly_analytics(weeks, tuple(sorted(completed_weeks)))
                 
                 # Create metrics for quick stats
-                total_weeks = len(df)
-                completed_weeks = df["completed_int"].sum()
+                total_weeks = analytics["total"]
+                completed_weeks = analytics["completed"]
                 completion_percentage = (completed_weeks / total_weeks) * 100 if total_weeks > 0 else 0
                 
                 # Display metrics in a row
@@ -668,63 +1007,29 @@ elif selected_tab == "Analytics":
                 st.subheader("Weekly Completion")
                 
                 # Create a bar chart with Streamlit
-                weekly_chart_df = pd.DataFrame({
-                    "Week": df["week_label"],
-                    "Completed": df["completed_int"]
-                }).set_index("Week")
-                
-                st.bar_chart(weekly_chart_df)
+                st.bar_chart(analytics["weekly_df"])
                 
                 # Calculate and display streak information
                 st.subheader("Streak Information")
                 
-                # Calculate current streak
-                current_streak = 0
-                for entry in reversed(completion_data):
-                    if entry["completed"]:
-                        current_streak += 1
-                    else:
-                        break
-                
-                # Calculate longest streak
-                longest_streak = 0
-                current = 0
-                for entry in completion_data:
-                    if entry["completed"]:
-                        current += 1
-                        longest_streak = max(longest_streak, current)
-                    else:
-                        current = 0
-                
                 # Display streak metrics
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Current Streak", f"{current_streak} weeks")
+                    st.metric("Current Streak", f"{analytics['current_streak']} weeks")
                 with col2:
-                    st.metric("Longest Streak", f"{longest_streak} weeks")
-                
-                # Create a line chart showing the streak over time
-                streak_data = []
-                current = 0
-                for entry in completion_data:
-                    if entry["completed"]:
-                        current += 1
-                    else:
-                        current = 0
-                    streak_data.append({"week": entry["week"], "streak": current})
-                
-                streak_df = pd.DataFrame(streak_data)
+                    st.metric("Longest Streak", f"{analytics['longest_streak']} weeks")
                 
                 # Create a line chart for streak visualization
                 st.subheader("Streak Over Time")
                 
-                # Format for display
-                streak_chart_df = pd.DataFrame({
-                    "Week": [f"Week {w}" for w in df["week_num"]],
-                    "Streak (weeks)": streak_df["streak"]
-                }).set_index("Week")
-                
-                st.line_chart(streak_chart_df)
+                st.line_chart(analytics["streak_df"])
+
+if selected_tab == "Track Habits":
+    track_habits_section()
+elif selected_tab == "Add Habits":
+    add_habits_section()
+elif selected_tab == "Analytics":
+    analytics_section()
 
 # Add footer
 st.markdown("---")
@@ -2,22 +2,24 @@ from datetime import datetime
 from dataclasses import dataclass
 from typing import List
 
-@dataclass
+@dataclass(slots=True)
 class HabitLog:
     habit: str
     completed: bool
 
-@dataclass
+@dataclass(slots=True)
 class DailyHabitLog:
     date: datetime
     habits: List[HabitLog]
 
-@dataclass
+@dataclass(slots=True)
 class WeeklyHabitLog:
     week: str
     habits: List[HabitLog]
 
-@dataclass
+@dataclass(slots=True)
 class Habit:
+    id: str
     name: str
     type: str # daily, weekly
+    created_at: str # YYYY-MM-DD